@@ -42,6 +42,7 @@ class RubiksCube:
         self.size = size
         self.n = size - 1  # Max index (e.g., 2 for 3x3)
         self.faces: Dict[str, np.ndarray] = self._create_solved_faces()
+        self.version = 0 # Incremented on every state change, so observers can skip redundant refreshes
 
         # --- Print color counts on initialization ---
         print("--- Initial Cube State Color Counts ---")
@@ -64,14 +65,17 @@ class RubiksCube:
 
     def _create_solved_faces(self) -> Dict[str, np.ndarray]:
         """Creates the face dictionary representing a solved cube."""
+        # int8 is plenty for six color indices, and keeps the arrays the viewer reads
+        # every update an eighth of the size of the default int64
         return {
-            face: np.full((self.size, self.size), COLOR_MAP_CHAR_TO_INT[face], dtype=int)
+            face: np.full((self.size, self.size), COLOR_MAP_CHAR_TO_INT[face], dtype=np.int8)
             for face in FACE_NAMES
         }
 
     def reset(self) -> None:
         """Resets the cube to the solved state."""
         self.faces = self._create_solved_faces()
+        self.version += 1
 
     def get_state_faces(self) -> Dict[str, np.ndarray]:
         """
@@ -85,16 +89,16 @@ class RubiksCube:
 
     def get_state_for_solver(self) -> np.ndarray:
         """
-        Constructs a NumPy array representing the cube's state, primarily for the viewer.
+        Constructs a NumPy array representing the cube's state, one entry per cubie.
         Each cubie position (x,y,z) stores an array of 6 color indices,
         corresponding to its potential faces in the order: -X(L), +X(R), -Y(D), +Y(U), -Z(B), +Z(F).
         Non-existent faces (e.g., for center or internal pieces) are marked with -1.
 
-        Note: This method's output format (size, size, size, 6) is for the RubiksCubeViewer.
-        The Kociemba solver (used in `get_solve_steps`) might expect a different format
-        (e.g., the older 3x3x3 single-color-per-cubie-position array).
-        If so, the `get_solve_steps` method or the solver interface might need adjustment
-        to convert this 6D state or use a dedicated state-fetching method for the solver.
+        Note: The RubiksCubeViewer no longer calls this method. It reads `self.faces`
+        directly, so `faces` stays the authoritative state, and it skips redraws while
+        `self.version` is unchanged, so any code that modifies `faces` must also bump
+        `version`. The Kociemba solver (used in `get_solve_steps`) builds its own
+        facelet string from `faces` as well.
 
         Returns:
             A (size, size, size, 6) NumPy array representing the detailed cube state.
@@ -249,6 +253,8 @@ class RubiksCube:
                 self.faces['D'][n, :] = self.faces['L'][::-1, 0]
                 self.faces['L'][:, 0] = temp
 
+        self.version += 1
+
 
     def scramble(self, num_moves: int = 25, seed: Optional[int] = None) -> str:
         """
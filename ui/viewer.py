@@ -1,8 +1,10 @@
 # c:\Users\Chris\Documents\GitHub\RubikSimulator\ui\viewer.py
-from ursina import Entity, color, Quad, load_model, Vec3, scene, destroy, invoke, Sequence, Func, Wait, curve, mouse
+from ursina import Entity, color, Quad, load_model, Vec3, scene, destroy, Sequence, Func, Wait, curve, mouse, BoxCollider
 import numpy as np # Keep numpy for state checking if needed
 import sys
-from typing import TYPE_CHECKING # Import for type hinting
+import functools
+from collections import deque
+from typing import TYPE_CHECKING, NamedTuple # Import for type hinting
 
 # Import your cube class for type hinting (avoids circular import issues)
 if TYPE_CHECKING:
@@ -20,9 +22,84 @@ INT_COLOR_MAP = {
     -1: color.black # Optional: Color for potential interior pieces if needed
 }
 
+# The same mapping baked into a NumPy object array so update_colors can resolve every
+# facelet in one gather. Slot 6 holds the fallback for unknown indices; -1 lands in
+# the last slot through NumPy's negative indexing. Filled per element because Color
+# is itself a sequence and would otherwise be broadcast into the array.
+_COLOR_LUT_FALLBACK = 6
+_COLOR_LUT = np.empty(8, dtype=object)
+_COLOR_LUT[_COLOR_LUT_FALLBACK] = color.pink
+for _color_index, _color in INT_COLOR_MAP.items():
+    _COLOR_LUT[_color_index] = _color
+# Marks a facelet that update_colors has not colored yet (it still shows light gray)
+_LUT_UNCOLORED = -2
+
 # Import the constant directly from the cube module
 from cube.cube import FACE_NAMES
 
+# Animation parameters for every legal move string, built once instead of parsed per move:
+# move -> (axis_index, slice_is_max, angle). slice_is_max selects layer n (U, R, F) rather
+# than layer 0 (D, L, B); angle is in degrees, positive for clockwise. Lowercase face
+# letters are accepted, as the model's parser does.
+_FACE_AXIS = {'U': 1, 'D': 1, 'L': 0, 'R': 0, 'F': 2, 'B': 2}
+_ROTATION_ATTRS = ('rotation_x', 'rotation_y', 'rotation_z') # Pivot attribute animated per axis_index
+_MOVE_CACHE = {}
+for _face in FACE_NAMES:
+    for _modifier, _angle in (('', 90), ("'", -90), ('2', 180)):
+        _MOVE_CACHE[_face + _modifier] = _MOVE_CACHE[_face.lower() + _modifier] = (_FACE_AXIS[_face], _face in 'URF', _angle)
+
+# --- Face Info: visual properties of each face, in facelet creation order ---
+class _FaceInfo(NamedTuple):
+    name: str
+    offset: tuple   # Facelet center relative to its cubie's center
+    rotation: tuple # Turns the facelet to face outwards
+    axis: int       # 0=X, 1=Y, 2=Z
+    dir: int        # 1=Positive face (R, U, F), -1=Negative face (L, D, B)
+
+_FACE_INFO = (
+    _FaceInfo('U', (0, 0.501, 0), (-90, 0, 0), 1, 1),  # Up (+Y)
+    _FaceInfo('D', (0,-0.501, 0), (90, 0, 0),  1, -1), # Down (-Y)
+    _FaceInfo('R', (0.501, 0, 0), (0, 90, 0),  0, 1),  # Right (+X)
+    _FaceInfo('L', (-0.501,0, 0), (0,-90, 0),  0, -1), # Left (-X)
+    _FaceInfo('F', (0, 0, 0.501), (0, 0, 0),   2, 1),  # Front (+Z)
+    _FaceInfo('B', (0, 0,-0.501), (0, 180, 0), 2, -1), # Back (-Z)
+)
+
+# Index into FACE_NAMES of the model face holding each state slot (-X, +X, -Y, +Y, -Z, +Z)
+_SLOT_FACE_IDS = np.array([FACE_NAMES.index(name) for name in ('L', 'R', 'D', 'U', 'B', 'F')])
+
+# Set to True to print per-frame/per-move diagnostics (kept off: printing in hot paths is costly)
+_DEBUG = False
+
+# Hover quadrant ids. Clockwise turns (right, up) sort below counter-clockwise
+# ones (left, down), so get_move_from_current_hover needs a single comparison.
+QUADRANT_RIGHT, QUADRANT_UP, QUADRANT_LEFT, QUADRANT_DOWN = range(4)
+# Hover quadrant keyed by (vertical_dominant << 2) | (positive << 1) | negative;
+# see update_hover_highlight. Ties and dead-zone hits map to None.
+_QUADRANT_LUT = (None, QUADRANT_LEFT, QUADRANT_RIGHT, None, None, QUADRANT_DOWN, QUADRANT_UP, None)
+
+def _snap90(angle: float) -> int:
+    """Rounds an angle in degrees to the nearest multiple of 90."""
+    return round(angle / 90) * 90
+
+@functools.lru_cache(maxsize=4)
+def _load_piece_model(name: str) -> str:
+    """
+    Resolves the model name to use for backing pieces.
+
+    Returns `name` if '<name>.obj' can be loaded, otherwise the built-in 'cube'.
+    Cached so the asset-folder search (and OBJ parse) happens once per process
+    instead of on every viewer rebuild, e.g. when the cube size changes.
+    """
+    try:
+        found = load_model(f'{name}.obj')
+    except Exception:
+        found = None
+    if not found:
+        print(f"Warning: '{name}.obj' not found. Using default 'cube' model.")
+        return 'cube'
+    return name
+
 class RubiksCubeViewer:
     def __init__(self, cube_model: 'RubiksCube'): # Use type hint
         """
@@ -37,34 +114,74 @@ class RubiksCubeViewer:
         # Check if the cube_model has the required attributes and methods
         if not hasattr(cube_model, 'size'):
             raise AttributeError("cube_model must have a 'size' attribute.")
-        if not hasattr(cube_model, 'get_state_for_solver') or not callable(cube_model.get_state_for_solver):
-             raise AttributeError("cube_model must have a callable 'get_state_for_solver' method.")
-        # We will check the shape of the returned state in update_colors
+        if not hasattr(cube_model, 'faces'):
+             raise AttributeError("cube_model must have a 'faces' dict of per-face color arrays.")
+        # We will check the shape of the face arrays in update_colors
 
         self.parent_entity = Entity(model=None, name="CubeParent")
         # Store facelets keyed by their logical position and orientation
-        # (x, y, z, axis_index, direction) -> Entity
+        # (x, y, z, axis_index, direction) -> Entity. Kept for lookups by key; per-frame
+        # code uses the flat _facelet_entities list below instead
         self.facelets = {}
         # Store backing pieces keyed by their logical position
         # (x, y, z) -> Entity
         self.backing_pieces = {}
-        self._initial_update_done = False # Flag to print state only once
+        # Flat per-facelet storage used by the hot paths. Facelets are dense and face-major:
+        # position face_id*size*size + row*size + col, where face_id follows _FACE_INFO and
+        # (row, col) are the cubie's two in-plane coordinates in x, y, z order. Row i of
+        # _facelet_indices holds (x, y, z, state slot) for _facelet_entities[i], and
+        # each entity carries i as its facelet_index.
+        self._facelet_indices = np.empty((0, 4), dtype=np.int32)
+        self._facelet_entities = []
+        # Same lookup raveled into the flat state array, plus a reusable output buffer
+        self._facelet_flat_indices = np.empty(0, dtype=np.intp)
+        self._color_index_buf = np.empty(0, dtype=np.int8)
+        self._prev_lut_indices = np.empty(0, dtype=np.int8) # Color LUT slot each facelet currently shows (or _LUT_UNCOLORED)
+        # (axis, coordinate) -> entities in that slice, so animate_move needs no scan
+        self._slice_entities = {}
+        self._last_state_version = None # cube_model.version last pushed to the facelets
         self.is_animating = False # Flag to prevent concurrent animations
+        self._built_size = None # cube_model.size the current entities were built for
+        self._geometry_dirty = False # Set once an animated move has re-parented/re-posed pieces
+        self._pending_moves = deque() # (move, duration) requested while a turn was playing
+        # Single pivot reused by every move; pieces of the turning slice are parented to it
+        self._pivot = Entity(parent=self.parent_entity, name="pivot", enabled=False)
 
         # --- Attributes for mouse interaction ---
-        self.hovered_facelet_details = None  # Tuple: (facelet_entity, quadrant_name) for actionable hover
+        self.hovered_facelet_details = None  # Tuple: (facelet_entity, quadrant_id) for actionable hover
         self.last_hovered_facelet_entity = None # Stores the last facelet entity that was generally hovered
-        self.original_facelet_colors = {}    # Stores original color of facelets for highlighting
         self.quadrant_highlight_indicator = None # Entity to show quadrant highlight
         self.highlight_intensity = 0.3       # How much to lighten/mix color for facelet highlight
         self.facelet_thickness = 0.05        # Thickness for cube facelets
         self.quadrant_dead_zone = 0.15       # Percentage of facelet half-size for dead zone (e.g., 0.1 means 10% dead zone from center)
+        self._abs_dead_zone = self.quadrant_dead_zone * 0.45 # Dead zone in facelet-local units (facelet half-size 0.45)
+        # Indicator position in the hovered facelet's local space, indexed by quadrant id
+        # Just outside the sticker quad at local z=0.5: 0.01 world units, far enough that the
+        # two do not z-fight at the camera distances used for large cubes
+        indicator_z_pos_local_to_facelet = 0.5 + 0.01 / self.facelet_thickness
+        offset_dist = 0.45 * 0.6
+        self._quadrant_positions = (
+            Vec3(offset_dist, 0, indicator_z_pos_local_to_facelet),  # QUADRANT_RIGHT
+            Vec3(0, offset_dist, indicator_z_pos_local_to_facelet),  # QUADRANT_UP
+            Vec3(-offset_dist, 0, indicator_z_pos_local_to_facelet), # QUADRANT_LEFT
+            Vec3(0, -offset_dist, indicator_z_pos_local_to_facelet), # QUADRANT_DOWN
+        )
 
         self.create_visualization()
         self.update_colors() # Initial color update
+        if __debug__ and _DEBUG:
+            self._debug_dump_state(self._stack_model_faces())
 
     def create_visualization(self):
         """Creates the Ursina entities representing the Rubik's Cube of size n."""
+        size = self.cube_model.size # Get size 'n' from the model
+        # Entities depend only on the size: if that is unchanged and no move has touched
+        # their transforms or slice lookup, a refresh of the colors is all a repeated call
+        # needs, not a destroy and rebuild of every entity
+        if size == self._built_size and self.facelets and not self._geometry_dirty:
+            self.update_colors()
+            return
+        self._built_size = None
 
         # Clear previous visualization if any
         for piece in self.backing_pieces.values():
@@ -73,89 +190,115 @@ class RubiksCubeViewer:
             if facelet: destroy(facelet)
         self.backing_pieces = {} # Reset dictionary
         self.facelets.clear()
+        self._facelet_indices = np.empty((0, 4), dtype=np.int32)
+        self._facelet_entities = []
+        self._facelet_flat_indices = np.empty(0, dtype=np.intp)
+        self._color_index_buf = np.empty(0, dtype=np.int8)
+        self._prev_lut_indices = np.empty(0, dtype=np.int8)
+        self._slice_entities = {}
+        self._last_state_version = None # New facelets have not been colored yet
+        self.last_hovered_facelet_entity = None
 
-        size = self.cube_model.size # Get size 'n' from the model
         if size < 2:
             print("Warning: Cube size must be at least 2.", file=sys.stderr)
             return
         n = size - 1 # Max index
         offset = (size - 1) / 2.0 # Center the cube visually
-
-        # --- Model Loading (remains the same) ---
-        try:
-            piece_model = load_model('rubik_piece.obj', use_deepcopy=True)
-            piece_scale = 1.0
-        except Exception:
-            print("Warning: 'rubik_piece.obj' not found. Using default 'cube' model.")
-            piece_model = 'cube'
-            piece_scale = 1.0
-
-        # --- Face Info: Maps normal vector to visual properties ---
-        # axis: 0=X, 1=Y, 2=Z
-        # dir: 1=Positive face (R, U, F), -1=Negative face (L, D, B)
-        face_info = {
-            Vec3(0, 1, 0): {'name': 'U', 'offset': Vec3(0, 0.501, 0), 'rotation': Vec3(-90, 0, 0), 'axis': 1, 'dir': 1},  # Up (+Y)
-            Vec3(0,-1, 0): {'name': 'D', 'offset': Vec3(0,-0.501, 0), 'rotation': Vec3(90, 0, 0),   'axis': 1, 'dir': -1}, # Down (-Y)
-            Vec3(1, 0, 0): {'name': 'R', 'offset': Vec3(0.501, 0, 0), 'rotation': Vec3(0, 90, 0),   'axis': 0, 'dir': 1},  # Right (+X)
-            Vec3(-1,0, 0): {'name': 'L', 'offset': Vec3(-0.501,0, 0), 'rotation': Vec3(0,-90, 0),  'axis': 0, 'dir': -1}, # Left (-X)
-            Vec3(0, 0, 1): {'name': 'F', 'offset': Vec3(0, 0, 0.501), 'rotation': Vec3(0, 0, 0),    'axis': 2, 'dir': 1},  # Front (+Z)
-            Vec3(0, 0,-1): {'name': 'B', 'offset': Vec3(0, 0,-0.501), 'rotation': Vec3(0, 180, 0), 'axis': 2, 'dir': -1}, # Back (-Z)
-        }
-
-        # Iterate through all n*n*n potential cubie positions
-        for x in range(size):
-            for y in range(size):
-                for z in range(size):
-                    pos_x = x - offset
-                    pos_y = y - offset
-                    pos_z = z - offset
-                    is_internal = (0 < x < n and 0 < y < n and 0 < z < n)
-
-                    # Create backing piece (dark grey cube) if it's not internal
-                    if not is_internal:
-                        piece = Entity(
-                            model=piece_model,
-                            color=color.dark_gray,
-                            position=(pos_x, pos_y, pos_z),
-                            scale=piece_scale,
-                            parent=self.parent_entity,
-                            name=f"piece_{x}_{y}_{z}",
-                            # Store logical coordinates for easy lookup
-                            logic_coords=(x, y, z),
-                            collider=None # Explicitly disable collider for backing pieces
-                        )
-                        self.backing_pieces[(x, y, z)] = piece
-                    # Create facelets (colored quads) for exterior faces
-                    for normal, info in face_info.items():
-                        is_exterior = False
-                        if info['axis'] == 1 and info['dir'] == 1 and y == n: is_exterior = True    # Top face
-                        elif info['axis'] == 1 and info['dir'] == -1 and y == 0: is_exterior = True # Bottom face
-                        elif info['axis'] == 0 and info['dir'] == 1 and x == n: is_exterior = True  # Right face
-                        elif info['axis'] == 0 and info['dir'] == -1 and x == 0: is_exterior = True # Left face
-                        elif info['axis'] == 2 and info['dir'] == 1 and z == n: is_exterior = True  # Front face
-                        elif info['axis'] == 2 and info['dir'] == -1 and z == 0: is_exterior = True # Back face
-
-                        if is_exterior:
-                            try:
-                                facelet_key = (x, y, z, info['axis'], info['dir'])
-                                facelet = Entity(
-                                    model='cube', # Changed from Quad
-                                    scale=(0.9, 0.9, self.facelet_thickness), # Apply thickness
-                                    color=color.light_gray, # Default color
-                                    position=Vec3(pos_x, pos_y, pos_z) + info['offset'],
-                                    rotation=info['rotation'], # Rotation to face outwards
-                                    parent=self.parent_entity, # Parent to the main cube entity
-                                    double_sided=False, # Less relevant for opaque cube, but keep for consistency
-                                    name=f"facelet_cube_{info['name']}_{x}_{y}_{z}",
-                                    # Store logical coordinates and face info for easy lookup
-                                    logic_key=facelet_key,
-                                    main_face_name=info['name'], # Store 'U', 'F', etc. for interaction
-                                    collider='box' # Ensure it's collidable for mouse hover
-                                )
-                                facelet.world_parent = self.parent_entity
-                                self.facelets[facelet_key] = facelet
-                            except Exception as e:
-                                print(f"Error creating facelet for key {facelet_key}: {e}", file=sys.stderr)
+        facelet_indices = np.empty((6 * size * size, 4), dtype=np.int32)
+
+        # --- Model Loading ---
+        # Backing pieces all share one geometry, so hand the model to Ursina by name:
+        # its mesh cache then gives every Entity a copy that shares the same vertex
+        # data, instead of one deep-copied (and separately uploaded) mesh per piece.
+        piece_model = _load_piece_model('rubik_piece')
+        piece_scale = 1.0
+        # Same for facelets: the built-in unit 'quad' (two triangles; a thin 'cube' costs
+        # 24 vertices per facelet) is loaded once and then shared by every facelet,
+        # where a procedural Quad() would build and upload a new mesh per facelet.
+        facelet_model = 'quad'
+
+        # Create backing pieces (dark grey cubes) for every non-internal cubie position.
+        # The shell mask is broadcast from open grids, and argwhere lists only the
+        # shell positions (x-major order, as the nested loops it replaces), so neither
+        # NumPy nor Python ever materializes coordinates for the interior.
+        X, Y, Z = np.ogrid[:size, :size, :size]
+        shell = (X == 0) | (X == n) | (Y == 0) | (Y == n) | (Z == 0) | (Z == n)
+        shell_coords = np.argwhere(shell)
+        for x, y, z in shell_coords.tolist():
+            piece = Entity(
+                model=piece_model,
+                color=color.dark_gray,
+                position=(x - offset, y - offset, z - offset),
+                scale=piece_scale,
+                parent=self.parent_entity,
+                name=f"piece_{x}_{y}_{z}",
+                # Store logical coordinates for easy lookup
+                logic_coords=(x, y, z),
+                collider=None # Explicitly disable collider for backing pieces
+            )
+            self.backing_pieces[(x, y, z)] = piece
+            for axis, coord in enumerate((x, y, z)):
+                self._slice_entities.setdefault((axis, coord), []).append(piece)
+
+        # Create facelets (colored quads). Each face's cubies are picked out of the same
+        # shell coordinates with one NumPy compare, so only the 6*size*size exterior
+        # (cubie, face) pairs are ever visited in Python.
+        for info in _FACE_INFO:
+            fixed_coord = n if info.dir == 1 else 0 # Layer this face lies on along its axis
+            # Index into the last axis of get_state_for_solver(): -X, +X, -Y, +Y, -Z, +Z
+            tuple_idx = info.axis * 2 + (0 if info.dir == -1 else 1)
+            face_cubies = shell_coords[shell_coords[:, info.axis] == fixed_coord]
+            # All of this face's facelet positions in one broadcast add: cubie coordinates
+            # shifted by the centering offset and the face's outward offset
+            face_positions = face_cubies + (np.array(info.offset) - offset)
+            for (x, y, z), position in zip(face_cubies.tolist(), face_positions.tolist()):
+                try:
+                    facelet_key = (x, y, z, info.axis, info.dir)
+                    facelet = Entity(
+                        model=facelet_model,
+                        # Shift the quad onto the facelet's outer local z=0.5 face: 0.526 from the
+                        # cubie centre, where the old thin cube's surface was, clear of the backing
+                        # piece's face at 0.5 and flush with the BoxCollider face hover picking checks
+                        origin_z=-0.5,
+                        scale=(0.9, 0.9, self.facelet_thickness),
+                        color=color.light_gray, # Default color
+                        position=position,
+                        rotation=info.rotation, # Rotation to face outwards
+                        parent=self.parent_entity, # Parent to the main cube entity
+                        double_sided=True, # The quad's front side faces local -Z, i.e. into the cube
+                        name=f"facelet_cube_{info.name}_{x}_{y}_{z}",
+                        # Store logical coordinates and face info for easy lookup
+                        logic_key=facelet_key,
+                        main_face_name=info.name, # Store 'U', 'F', etc. for interaction
+                        is_facelet=True, # Cheap tag checked by the per-frame hover test
+                        facelet_index=len(self._facelet_entities), # Row in the flat per-facelet arrays
+                    )
+                    # Unit box collider, as the old 'cube' model had, so hover picking still
+                    # reports mouse.point on the local z=0.5 surface (see update_hover_highlight).
+                    # collider='box' would fit the flat quad's bounds and have no depth.
+                    facelet.collider = BoxCollider(facelet, center=Vec3(0, 0, 0), size=Vec3(1, 1, 1))
+                    self.facelets[facelet_key] = facelet
+                    facelet_indices[len(self._facelet_entities)] = (x, y, z, tuple_idx)
+                    self._facelet_entities.append(facelet)
+                    for axis, coord in enumerate((x, y, z)):
+                        self._slice_entities.setdefault((axis, coord), []).append(facelet)
+                except Exception as e:
+                    print(f"Error creating facelet for key {facelet_key}: {e}", file=sys.stderr)
+
+        self._facelet_indices = facelet_indices[:len(self._facelet_entities)]
+        # Where each facelet's color lives in the model's face arrays, stacked in FACE_NAMES
+        # order (the same mapping get_state_for_solver applies cubie by cubie)
+        xs, ys, zs, slots = self._facelet_indices.T
+        face_rows = np.choose(slots, (n - ys, n - ys, n - zs, zs, n - ys, n - ys))
+        face_cols = np.choose(slots, (n - zs, zs, xs, xs, n - xs, xs))
+        self._facelet_flat_indices = np.ravel_multi_index(
+            (_SLOT_FACE_IDS[slots], face_rows, face_cols), (len(FACE_NAMES), size, size))
+        # int8 matches the model's face arrays (color indices 0-5), so the gather neither
+        # widens nor casts
+        self._color_index_buf = np.empty(len(self._facelet_entities), dtype=np.int8)
+        self._prev_lut_indices = np.full(len(self._facelet_entities), _LUT_UNCOLORED, dtype=np.int8)
+        self._built_size = size
+        self._geometry_dirty = False
 
         expected_facelets = 6 * size * size
         if len(self.facelets) != expected_facelets:
@@ -165,189 +308,193 @@ class RubiksCubeViewer:
         if len(self.backing_pieces) != expected_backing:
              print(f"Warning: Created {len(self.backing_pieces)} backing piece entities, expected {expected_backing}.", file=sys.stderr)
 
+    def _stack_model_faces(self):
+        """Returns the model's face arrays stacked in FACE_NAMES order, or None if unusable."""
+        faces = self.cube_model.faces
+        try:
+            return np.stack([faces[name] for name in FACE_NAMES])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error: cube_model.faces could not be read as {len(FACE_NAMES)} equal-shaped face arrays: {e}", file=sys.stderr)
+            return None
+
+    def _debug_dump_state(self, state_array):
+        """Writes every face of the initial state to stderr (only when _DEBUG is on)."""
+        if state_array is None:
+            return
+        # Format every face up front and emit the whole dump in one write
+        lines = ["", "--- Initial State Received by Viewer ---", f"Shape: {state_array.shape}"]
+        for name, face in zip(FACE_NAMES, state_array):
+            lines.append(f"{name}:")
+            lines.append(np.array2string(face, threshold=sys.maxsize, max_line_width=120))
+        lines.append("----------------------------------------\n")
+        sys.stderr.write("\n".join(lines) + "\n")
+
     def update_colors(self):
         """Updates facelet colors based on the cube_model's state."""
-        state_array = self.cube_model.get_state_for_solver()
-
-        if not self._initial_update_done:
-            print("\n--- Initial State Received by Viewer ---")
-            print(f"Shape: {state_array.shape}")
-            model_max_index = self.cube_model.size - 1
-            print("U (Y=n):")
-            print(state_array[:, model_max_index, :])
-            print("R (X=n):")
-            print(state_array[model_max_index, :, :])
-            print("F (Z=n):")
-            print(state_array[:, :, model_max_index])
-            print("D (Y=0):")
-            print(state_array[:, 0, :])
-            print("L (X=0):")
-            print(state_array[0, :, :])
-            print("B (Z=0):")
-            print(state_array[:, :, 0])
-            print("----------------------------------------\n")
-            self._initial_update_done = True
-
-        expected_shape = (self.cube_model.size, self.cube_model.size, self.cube_model.size, 6)
-        if not isinstance(state_array, np.ndarray) or state_array.shape != expected_shape:
-             print(f"Error: get_state_for_solver() returned invalid state. Expected shape {expected_shape}, got {type(state_array)} with shape {getattr(state_array, 'shape', 'N/A')}.", file=sys.stderr)
-             print("Ensure cube_model.get_state_for_solver() returns a NumPy array where each element [x,y,z] is a tuple/array of 6 color indices (for -X, +X, -Y, +Y, -Z, +Z faces of the cubie at x,y,z).", file=sys.stderr)
+        # The model bumps `version` on every state change (see RubiksCube.version), so an
+        # unchanged counter means the facelets already show this state. Models without a
+        # counter are redrawn on every call; the diff below still limits the color writes.
+        model_version = getattr(self.cube_model, 'version', None)
+        if model_version is not None and model_version == self._last_state_version:
+            return
+        # Gather straight from the model's six size x size face arrays: that is 6*size*size
+        # contiguous values, where get_state_for_solver() would first build a
+        # (size, size, size, 6) array cubie by cubie in Python
+        state_array = self._stack_model_faces()
+        if state_array is None:
+            return
+
+        expected_shape = (len(FACE_NAMES), self.cube_model.size, self.cube_model.size)
+        if state_array.shape != expected_shape:
+             print(f"Error: cube_model.faces has invalid shape. Expected {expected_shape} once stacked, got {state_array.shape}.", file=sys.stderr)
+             print("Ensure cube_model.faces maps each of " + ", ".join(FACE_NAMES) + " to a size x size NumPy array of color indices.", file=sys.stderr)
              return
 
-        for key, facelet_entity in self.facelets.items():
-            if facelet_entity:
-                x, y, z, face_axis, face_direction = key
-                try:
-                    cubie_face_colors = state_array[x, y, z]
-                    if face_axis == 0:
-                        tuple_idx = 0 if face_direction == -1 else 1
-                    elif face_axis == 1:
-                        tuple_idx = 2 if face_direction == -1 else 3
-                    else:
-                        tuple_idx = 4 if face_direction == -1 else 5
-                    color_index = cubie_face_colors[tuple_idx]
-                    facelet_entity.color = INT_COLOR_MAP.get(color_index, color.pink)
-                except IndexError:
-                    print(f"Error: Index out of bounds ({x},{y},{z}) accessing state array.", file=sys.stderr)
-                    facelet_entity.color = color.magenta
-                except KeyError:
-                    print(f"Error: Color index {color_index} not found in INT_COLOR_MAP.", file=sys.stderr)
-                    facelet_entity.color = color.cyan
-                except Exception as e:
-                    print(f"Error updating color for facelet {key}: {e}", file=sys.stderr)
-                    facelet_entity.color = color.black
+        self._last_state_version = model_version
+
+        if not self._facelet_entities: # Nothing was built (e.g. size < 2)
+            return
+        # One gather into a preallocated buffer: no per-update index arrays or result allocation
+        color_indices = np.take(state_array.ravel(), self._facelet_flat_indices, out=self._color_index_buf)
+        # Validate the whole batch with two reductions; only a state holding unknown codes
+        # pays for the masked remap onto the fallback color
+        if color_indices.min() >= -1 and color_indices.max() < _COLOR_LUT_FALLBACK:
+            lut_indices = color_indices
+        else:
+            valid = (color_indices >= -1) & (color_indices < _COLOR_LUT_FALLBACK)
+            lut_indices = np.where(valid, color_indices, _COLOR_LUT_FALLBACK)
+        # Only facelets whose color actually changed get a property write
+        changed = np.flatnonzero(lut_indices != self._prev_lut_indices)
+        self._prev_lut_indices[:] = lut_indices # Copy: lut_indices may be the reused gather buffer
+        facelet_entities = self._facelet_entities
+        # Indices come from our own construction and the LUT maps every value to a color
+        # (out-of-range ones to pink), so nothing in this loop can raise
+        for i, facelet_color in zip(changed.tolist(), _COLOR_LUT[lut_indices[changed]]):
+            facelet_entities[i].color = facelet_color
 
     def animate_move(self, move: str, duration: float = 0.2):
         if self.is_animating:
-            print("Warning: Animation already in progress. Move ignored.", file=sys.stderr)
+            # Play it once the current turn has finished
+            self._pending_moves.append((move, duration))
             return
-        print(f"[DEBUG] animate_move START for '{move}'. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}")
+        if __debug__ and _DEBUG:
+            print(f"[DEBUG] animate_move START for '{move}'. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}")
         if not move:
             return
 
-        size = self.cube_model.size
-        n = size - 1
-        face_char = move[0].upper()
-        if face_char not in FACE_NAMES:
-            print(f"Error: Invalid move face '{face_char}' in animate_move.", file=sys.stderr)
+        try:
+            axis_index, slice_is_max, angle = _MOVE_CACHE[move]
+        except KeyError:
+            print(f"Error: Invalid move '{move}' in animate_move.", file=sys.stderr)
             return
+        slice_index_val = self.cube_model.size - 1 if slice_is_max else 0
 
-        direction = 1
-        turns = 1
-        if len(move) > 1:
-            if move[1] == "'": direction = -1
-            elif move[1] == '2': turns = 2
-            else:
-                print(f"Error: Invalid move modifier '{move[1]}' in animate_move.", file=sys.stderr)
-                return
-        if len(move) > 2:
-             print(f"Error: Invalid move format '{move}' in animate_move.", file=sys.stderr)
-             return
-        angle = 90 * direction * turns
-
-        slice_info = {'U': (1, n), 'D': (1, 0), 'L': (0, 0), 'R': (0, n), 'F': (2, n), 'B': (2, 0)}
-        if face_char not in slice_info:
-            print(f"Error: Could not determine slice for face '{face_char}'.", file=sys.stderr)
-            return
-        axis_index, slice_index_val = slice_info[face_char] # Renamed slice_index to avoid conflict
-
-        selected_entities = set()
-        for coords, piece_entity in self.backing_pieces.items():
-            if coords[axis_index] == slice_index_val:
-                selected_entities.add(piece_entity)
-        for key, facelet_entity in self.facelets.items():
-            cubie_logical_coords = key[:3]
-            if cubie_logical_coords[axis_index] == slice_index_val:
-                selected_entities.add(facelet_entity)
-        pieces_to_move = list(selected_entities)
+        slice_key = (axis_index, slice_index_val)
+        pieces_to_move = self._slice_entities.get(slice_key, ())
 
         if not pieces_to_move:
             print(f"Warning: No pieces found for move '{move}' (axis={axis_index}, slice={slice_index_val}).", file=sys.stderr)
             return
 
         self.is_animating = True
+        self._geometry_dirty = True # Pieces leave their built pose; the next rebuild must be a real one
 
-        # Create a temporary pivot entity for rotation
-        pivot = Entity(parent=self.parent_entity, name=f"pivot_{move}")
+        # Reset the shared pivot rather than creating a new entity for every move
+        pivot = self._pivot
+        pivot.rotation = Vec3(0, 0, 0)
+        pivot.enabled = True
 
-        # Parent the pieces to the pivot
+        # Parent the pieces to the pivot. The pivot sits at the parent's origin with
+        # no rotation, so a plain reparent keeps every local pose unchanged and
+        # skips the world-space recomputation done by world_parent.
         for p in pieces_to_move:
-            p.world_parent = pivot
-
-        # Determine the rotation axis and angle for the animation
-        rotation_axis = None
-        if face_char in ('U', 'D'):
-            rotation_axis = 'rotation_y'
-        elif face_char in ('L', 'R'):
-            rotation_axis = 'rotation_x'
-        elif face_char in ('F', 'B'):
-            rotation_axis = 'rotation_z'
-
-        # Animate the pivot
-        if rotation_axis:
-            pivot.animate(rotation_axis, -angle, duration=duration, curve=curve.linear)
-
-        # Schedule the cleanup function to run after the animation
-        invoke(self._finish_animation, pivot, pieces_to_move, delay=duration + 0.01)
-
-    def _finish_animation(self, pivot: Entity, moved_pieces: list):
-        print(f"[DEBUG] _finish_animation START. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}")
-        pivot.rotation_x = round(pivot.rotation_x / 90) * 90
-        pivot.rotation_y = round(pivot.rotation_y / 90) * 90
-        pivot.rotation_z = round(pivot.rotation_z / 90) * 90
-        final_world_transforms = {piece: piece.world_transform for piece in moved_pieces}
-        for p in moved_pieces:
-            p.world_parent = self.parent_entity
-        destroy(pivot)
+            p.parent = pivot
+
+        # Animate the pivot about the slice's axis, and run the cleanup as the last step of
+        # that same sequence: it fires right after the final rotation step, where a separate
+        # timer could land before it (the animator runs slightly longer than duration)
+        rotation = pivot.animate(_ROTATION_ATTRS[axis_index], -angle, duration=duration, curve=curve.linear)
+        if rotation is None: # duration 0: Ursina applied the rotation immediately
+            self._finish_animation(pieces_to_move, axis_index, -angle)
+        else:
+            rotation.append(Func(self._finish_animation, pieces_to_move, axis_index, -angle))
+
+    def _finish_animation(self, moved_pieces: list, axis_index: int, target_angle: float):
+        pivot = self._pivot
+        if __debug__ and _DEBUG:
+            print(f"[DEBUG] _finish_animation START. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}")
+        # The pivot started from zero and turned about one axis, so its exact final
+        # rotation is known: assign it rather than snapping what the animation left
+        target_rotation = [0, 0, 0]
+        target_rotation[axis_index] = target_angle
+        pivot.rotation = Vec3(*target_rotation)
+        # Bake the snapped pivot rotation into each piece's local pose directly:
+        # the pivot only rotates about the parent's origin, so the new pose relative
+        # to parent_entity is that rotation applied to the piece's pose under the pivot.
+        pivot_quat = pivot.quaternion
         for p in moved_pieces:
-            p.world_transform = final_world_transforms[p]
-            p.rotation_x = round(p.rotation_x / 90) * 90
-            p.rotation_y = round(p.rotation_y / 90) * 90
-            p.rotation_z = round(p.rotation_z / 90) * 90
+            new_position = pivot_quat.xform(p.getPos())
+            new_quat = p.quaternion * pivot_quat
+            p.parent = self.parent_entity
+            p.setPos(new_position)
+            p.quaternion = new_quat
+            # One read and one write of the Euler angles instead of three of each
+            rx, ry, rz = p.rotation
+            p.rotation = Vec3(_snap90(rx), _snap90(ry), _snap90(rz))
+        pivot.enabled = False
         self.is_animating = False
-        print(f"[DEBUG] _finish_animation END. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}. Move completed.")
+        if __debug__ and _DEBUG:
+            print(f"[DEBUG] _finish_animation END. Parent entity world_rotation: {self.parent_entity.world_rotation}, world_position: {self.parent_entity.world_position}. Move completed.")
+        # Start the next queued move (skipping any that turn out to be invalid)
+        while self._pending_moves and not self.is_animating:
+            self.animate_move(*self._pending_moves.popleft())
+
+    def _resting_color(self, facelet_index: int):
+        """Color a facelet shows when it is not highlighted."""
+        lut_index = self._prev_lut_indices[facelet_index]
+        return color.light_gray if lut_index == _LUT_UNCOLORED else _COLOR_LUT[lut_index]
 
     def update_hover_highlight(self):
-        if self.last_hovered_facelet_entity:
-            if self.last_hovered_facelet_entity in self.original_facelet_colors:
-                self.last_hovered_facelet_entity.color = self.original_facelet_colors[self.last_hovered_facelet_entity]
+        # Read the mouse state and cached entities once; this runs every frame
+        last_hovered = self.last_hovered_facelet_entity
+        indicator = self.quadrant_highlight_indicator
+        if last_hovered:
+            last_hovered.color = self._resting_color(last_hovered.facelet_index)
             self.last_hovered_facelet_entity = None
-        if self.quadrant_highlight_indicator:
-            self.quadrant_highlight_indicator.enabled = False
+        if indicator:
+            indicator.enabled = False
         self.hovered_facelet_details = None
         current_hovered_entity = mouse.hovered_entity
 
-        if current_hovered_entity and hasattr(current_hovered_entity, 'main_face_name') and \
-           current_hovered_entity.name.startswith('facelet_cube_'):
+        if current_hovered_entity and getattr(current_hovered_entity, 'is_facelet', False):
             facelet = current_hovered_entity
             self.last_hovered_facelet_entity = facelet
-            self.original_facelet_colors.setdefault(facelet, facelet.color)
-            original_c = self.original_facelet_colors[facelet]
-            white_c = color.white
-            facelet.color = original_c * (1 - self.highlight_intensity) + white_c * self.highlight_intensity
+            # Blend toward white (1, 1, 1, 1) by highlight_intensity
+            k = self.highlight_intensity
+            facelet.color = color.rgba(*(c * (1 - k) + k for c in self._resting_color(facelet.facelet_index)))
 
-            if mouse.point is not None:
+            local_point = mouse.point
+            if local_point is not None:
                 try:
-                    local_point = mouse.point
-                    lx, ly = local_point.x, local_point.y
-                    abs_dead_zone = self.quadrant_dead_zone * 0.45
-                    quadrant_name = None
+                    lx, ly, lz = local_point.x, local_point.y, local_point.z
+                    abs_dead_zone = self._abs_dead_zone
+                    quadrant_id = None
                     
                     # THE KEY CHANGE IS HERE: Compare local_point.z against 0.5
                     expected_collider_surface_z = 0.5 
 
-                    if abs(local_point.z - expected_collider_surface_z) < 0.02: # Check against 0.5
-                        if abs(lx) > abs(ly):
-                            if lx > abs_dead_zone: quadrant_name = "right"
-                            elif lx < -abs_dead_zone: quadrant_name = "left"
-                        elif abs(ly) > abs(lx):
-                            if ly > abs_dead_zone: quadrant_name = "up"
-                            elif ly < -abs_dead_zone: quadrant_name = "down"
-
-                    if quadrant_name:
-                        self.hovered_facelet_details = (facelet, quadrant_name)
-                        if not self.quadrant_highlight_indicator:
-                            self.quadrant_highlight_indicator = Entity(
+                    if abs(lz - expected_collider_surface_z) < 0.02: # Check against 0.5
+                        # Pack the dominant axis and its sign (outside the dead zone) into a 3-bit key
+                        ax, ay = abs(lx), abs(ly)
+                        horizontal, vertical = ax > ay, ay > ax
+                        positive = (horizontal & (lx > abs_dead_zone)) | (vertical & (ly > abs_dead_zone))
+                        negative = (horizontal & (lx < -abs_dead_zone)) | (vertical & (ly < -abs_dead_zone))
+                        quadrant_id = _QUADRANT_LUT[(vertical << 2) | (positive << 1) | negative]
+
+                    if quadrant_id is not None:
+                        self.hovered_facelet_details = (facelet, quadrant_id)
+                        if not indicator:
+                            indicator = self.quadrant_highlight_indicator = Entity(
                                 model=Quad(scale=(0.25, 0.25)),
                                 color=color.rgba(255, 255, 0, 200),
                                 parent=facelet,
@@ -355,23 +502,20 @@ class RubiksCubeViewer:
                                 double_sided=True,
                                 z=0 
                             )
-                        self.quadrant_highlight_indicator.parent = facelet
-                        self.quadrant_highlight_indicator.enabled = True
-                        indicator_z_pos_local_to_facelet = (self.facelet_thickness / 2) + 0.01
-                        offset_dist = 0.45 * 0.6
-                        if quadrant_name == "right": self.quadrant_highlight_indicator.position = (offset_dist, 0, indicator_z_pos_local_to_facelet)
-                        elif quadrant_name == "left": self.quadrant_highlight_indicator.position = (-offset_dist, 0, indicator_z_pos_local_to_facelet)
-                        elif quadrant_name == "up": self.quadrant_highlight_indicator.position = (0, offset_dist, indicator_z_pos_local_to_facelet)
-                        elif quadrant_name == "down": self.quadrant_highlight_indicator.position = (0, -offset_dist, indicator_z_pos_local_to_facelet)
+                        # Only reparent when the hovered facelet changes; reparenting every frame
+                        # invalidates the indicator's cached transforms for nothing
+                        if indicator.parent is not facelet:
+                            indicator.parent = facelet
+                        indicator.enabled = True
+                        indicator.position = self._quadrant_positions[quadrant_id]
                 except Exception as e:
-                    print(f"    [DEBUG] Error during quadrant detection for {facelet.name}: {e}", file=sys.stderr)
+                    print(f"Error during quadrant detection for {facelet.name}: {e}", file=sys.stderr)
 
     def get_move_from_current_hover(self) -> str | None:
         if self.hovered_facelet_details:
-            facelet_entity, quadrant_name = self.hovered_facelet_details
+            facelet_entity, quadrant_id = self.hovered_facelet_details
             main_face_name = facelet_entity.main_face_name
-            if quadrant_name in ("right", "up"):
+            if quadrant_id < QUADRANT_LEFT: # right/up turn the face clockwise
                 return main_face_name
-            elif quadrant_name in ("left", "down"): 
-                return f"{main_face_name}'"
+            return f"{main_face_name}'"
         return None